@@ -0,0 +1,118 @@
+# bots499 - built-in 499 strategies and strategy plugin loading
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import random
+
+from game499 import *
+
+
+def legal_plays(lead, hand):
+    """Return the cards in hand that may be played to the lead suit.
+
+    Uses the same rule as GameState.legal_moves(), keeping hand order.
+    """
+    allowed = legal_mask(cards_mask(hand), SUITS[lead] - 1 if lead else None)
+    return [card for card in hand if allowed & (1 << CARD_INDEX[card])]
+
+
+def suit_lengths(hand):
+    lengths = dict((suit, 0) for suit in SUITS)
+    for card in hand:
+        lengths[card[SUIT]] += 1
+    return lengths
+
+
+class RandomStrategy(object):
+    """Bid and play uniformly at random from the legal moves."""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def bid(self, hand, current):
+        return self.rng.choice(legal_bids(current))
+
+    def play(self, hand, lead, trumps):
+        return self.rng.choice(legal_plays(lead, hand))
+
+
+class SimpleStrategy(object):
+    """Bid on the longest suit and play the cheapest legal card.
+
+    Opens at the minimum bid in its longest suit and only competes while
+    that suit is long and the hand holds honours. Leads its highest card
+    and otherwise follows with its lowest.
+    """
+
+    def __init__(self, seed=None):
+        pass
+
+    def bid(self, hand, current):
+        lengths = suit_lengths(hand)
+        best = max(sorted(SUITS, key=lambda s: SUITS[s]),
+                key=lambda s: lengths[s])
+        honours = len([c for c in hand if RANKS.index(c[RANK]) >= 9])
+        limit = MIN_BID + max(0, lengths[best] - 5) + honours // 4
+
+        for num in range(MIN_BID, min(limit, MAX_BID) + 1):
+            bid = "%d%s" % (num, best)
+            if valid_bid(current, bid) == BID_VALID:
+                return bid
+        return "PP"
+
+    def play(self, hand, lead, trumps):
+        cards = sorted(legal_plays(lead, hand),
+                key=lambda c: RANKS.index(c[RANK]))
+        if not lead:
+            return cards[-1]
+        return cards[0]
+
+
+# Strategies that can be named directly instead of by module path
+STRATEGIES = {
+    'random': RandomStrategy,
+    'simple': SimpleStrategy,
+}
+
+
+def load_strategy(spec, seed=None):
+    """Create a strategy from a built-in name or a "module[:attr]" path.
+
+    A plugin is any object with bid(hand, current) and
+    play(hand, lead, trumps) methods returning protocol strings. If the
+    named attribute (or the module itself) is callable it is called with
+    the seed to create the strategy.
+    """
+    if spec in STRATEGIES:
+        return STRATEGIES[spec](seed)
+
+    module_name, _, attr = spec.partition(':')
+    module = __import__(module_name, fromlist=['*'])
+    plugin = getattr(module, attr) if attr else module
+    if callable(plugin):
+        plugin = plugin(seed)
+    if not hasattr(plugin, 'bid') or not hasattr(plugin, 'play'):
+        raise ValueError("Strategy '%s' has no bid/play methods" % spec)
+    return plugin
@@ -0,0 +1,173 @@
+# deck499 - vectorised deck encoding shared by the deck tools
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from game499 import *
+
+# Cards in a deck, and the length of a deck line in serv499 deck files
+DECK_CARDS = len(CARDS)
+DECK_LINE = 2 * DECK_CARDS
+
+# ASCII rank and suit characters of each card, indexed by card index
+CARD_TEXT = np.array([[ord(c) for c in card] for card in CARDS],
+        dtype=np.uint8)
+
+# Card index of each rank and suit character, or BAD_CARD if not valid
+BAD_CARD = 255
+RANK_VALUE = np.full(256, BAD_CARD, dtype=np.uint8)
+RANK_VALUE[[ord(r) for r in RANKS]] = np.arange(len(RANKS))
+SUIT_VALUE = np.full(256, BAD_CARD, dtype=np.uint8)
+for suit, value in SUITS.items():
+    SUIT_VALUE[ord(suit)] = (value - 1) * len(RANKS)
+
+# Whitespace removed by str.rstrip at the end of a deck file line
+LINE_SPACE = np.zeros(256, dtype=bool)
+LINE_SPACE[[ord(c) for c in " \t\r\v\f"]] = True
+
+# Odd multipliers for deck_hashes, one per 8 byte word of a padded deck
+HASH_WORDS = (DECK_CARDS + 7) // 8
+HASH_MULTIPLIERS = np.random.RandomState(499).randint(
+        0, 2 ** 62, size=HASH_WORDS).astype(np.uint64) * 2 + 1
+
+
+def decks_to_text(decks):
+    """Encode an (n, 52) array of card indices as deck file lines."""
+    text = np.empty((len(decks), DECK_LINE + 1), dtype=np.uint8)
+    text[:, :DECK_LINE] = CARD_TEXT[decks].reshape(len(decks), DECK_LINE)
+    text[:, DECK_LINE] = ord('\n')
+    return text.tobytes()
+
+
+def text_to_decks(data):
+    """Decode deck file lines into an (n, 52) array of card indices.
+
+    data holds whole lines, each ending in a newline. Lines are checked
+    with the rules read_decks uses: after stripping trailing whitespace a
+    line must be 104 characters of valid cards. Returns the decks and the
+    index of the first bad line, or None if every line is valid.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+
+    lengths = ends - starts
+    good = lengths >= DECK_LINE
+
+    # Anything after the first 104 characters must be trailing whitespace
+    long_lines = np.flatnonzero(lengths > DECK_LINE)
+    if len(long_lines):
+        extra = lengths[long_lines] - DECK_LINE
+        offsets = np.cumsum(extra) - extra
+        tail = (np.repeat(starts[long_lines] + DECK_LINE - offsets, extra) +
+                np.arange(extra.sum()))
+        good[long_lines] = np.logical_and.reduceat(LINE_SPACE[buf[tail]],
+                offsets)
+
+    first_bad = None
+    if not good.all():
+        first_bad = int(np.argmin(good))
+        starts = starts[:first_bad]
+
+    text = buf[starts[:, None] + np.arange(DECK_LINE)]
+    ranks = RANK_VALUE[text[:, RANK::2]]
+    suits = SUIT_VALUE[text[:, SUIT::2]]
+    bad = (ranks == BAD_CARD) | (suits == BAD_CARD)
+    if bad.any():
+        bad_line = int(np.argmax(bad.any(axis=1)))
+        first_bad = bad_line
+        ranks = ranks[:bad_line]
+        suits = suits[:bad_line]
+    return ranks + suits, first_bad
+
+
+def seat_suit_counts(decks):
+    """Count the cards of each suit dealt to each seat.
+
+    Cards are dealt round the table as in serv499's deal_hand, so the
+    result has shape (n, seat, suit) with suits in SUITS order.
+    """
+    n = len(decks)
+    seats = np.arange(DECK_CARDS) % 4
+    keys = (np.arange(n)[:, None] * 16 + seats * 4 +
+            decks // len(RANKS)).ravel()
+    counts = np.bincount(keys, minlength=n * 16)
+    return counts.astype(np.uint8).reshape(n, 4, 4)
+
+
+def deck_hashes(decks):
+    """Return a 64 bit hash of each row of an (n, 52) uint8 deck array."""
+    padded = np.zeros((len(decks), HASH_WORDS * 8), dtype=np.uint8)
+    padded[:, :DECK_CARDS] = decks
+    words = padded.view(np.uint64)
+    with np.errstate(over='ignore'):
+        h = (words * HASH_MULTIPLIERS).sum(axis=1, dtype=np.uint64)
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(0xbf58476d1ce4e5b9)
+        h ^= h >> np.uint64(32)
+    return h
+
+
+class HashIndex(object):
+    """Set of deck hashes, used to find repeated decks.
+
+    Hashes are kept in sorted runs of roughly doubling size, so adding a
+    batch merges O(log n) runs instead of re-sorting everything seen.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def add(self, hashes):
+        """Add hashes and return a mask of those already seen.
+
+        A hash repeated within hashes is marked from its second occurrence.
+        """
+        unique, first = np.unique(hashes, return_index=True)
+        seen = np.ones(len(hashes), dtype=bool)
+        seen[first] = False
+
+        new = np.ones(len(unique), dtype=bool)
+        for run in self.runs:
+            pos = np.searchsorted(run, unique)
+            pos[pos == len(run)] = 0
+            new &= run[pos] != unique
+        seen[first[~new]] = True
+
+        run = unique[new]
+        if not len(run):
+            # Keep runs non-empty, as the search above indexes into them
+            return seen
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.concatenate((self.runs.pop(), run))
+            run.sort(kind='mergesort')
+        self.runs.append(run)
+        return seen
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+# deckstats499 - fairness report for serv499 deck files
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function, division
+import sys
+import argparse
+
+import numpy as np
+
+from game499 import *
+from deck499 import *
+
+# Bytes of text, or decks of binary, read per chunk
+CHUNK_BYTES = 4 * 1024 * 1024
+CHUNK_DECKS = CHUNK_BYTES // (DECK_LINE + 1)
+
+# High card points of each rank: A=4, K=3, Q=2, J=1
+HCP = np.array([max(0, i - 8) for i in range(len(RANKS))], dtype=np.uint8)
+MAX_HCP = len(RANKS) * 4
+
+SUIT_NAMES = sorted(SUITS, key=lambda s: SUITS[s])
+
+
+class DeckError(Exception):
+    pass
+
+
+def choose(n, k):
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def expected_rates():
+    """Exact chances for a random 13 card hand.
+
+    Returns (chance of each length 0..13 in a given suit, chance of at
+    least one void, chance of at least one singleton).
+    """
+    hands = choose(52, 13)
+    lengths = [choose(13, k) * choose(39, 13 - k) / hands
+            for k in range(14)]
+    void = singleton = 0
+    for a in range(14):
+        for b in range(14 - a):
+            for c in range(14 - a - b):
+                d = 13 - a - b - c
+                shape = (a, b, c, d)
+                p = (choose(13, a) * choose(13, b) * choose(13, c) *
+                        choose(13, d)) / hands
+                if 0 in shape:
+                    void += p
+                if 1 in shape:
+                    singleton += p
+    return lengths, void, singleton
+
+
+def read_text_decks(f):
+    """Yield arrays of decks from a text deck file, a chunk at a time."""
+    remainder = b''
+    line_count = 0
+    while True:
+        data = f.read(CHUNK_BYTES)
+        if not data:
+            break
+        data = remainder + data
+        cut = data.rfind(b'\n') + 1
+        if not cut and len(data) > CHUNK_BYTES:
+            raise DeckError("line %d is too long" % (line_count + 1))
+        remainder = data[cut:]
+        decks, bad = text_to_decks(data[:cut])
+        if bad is not None:
+            raise DeckError("line %d is not a valid deck" %
+                    (line_count + bad + 1))
+        line_count += len(decks)
+        if len(decks):
+            yield decks
+
+    if remainder:
+        # Last line has no newline
+        decks, bad = text_to_decks(remainder + b'\n')
+        if bad is not None:
+            raise DeckError("line %d is not a valid deck" % (line_count + 1))
+        yield decks
+
+
+def read_binary_decks(f):
+    """Yield arrays of decks from a file of 52 byte card index records."""
+    deck_count = 0
+    while True:
+        data = f.read(CHUNK_DECKS * DECK_CARDS)
+        if not data:
+            break
+        if len(data) % DECK_CARDS:
+            raise DeckError("file ends with a partial deck")
+        decks = np.frombuffer(data, dtype=np.uint8).reshape(-1, DECK_CARDS)
+        bad = (decks >= DECK_CARDS).any(axis=1)
+        if bad.any():
+            raise DeckError("deck %d is not a valid deck" %
+                    (deck_count + int(np.argmax(bad)) + 1))
+        deck_count += len(decks)
+        yield decks
+
+
+class DeckStats(object):
+    def __init__(self, duplicates=True):
+        self.decks = 0
+        self.incomplete = 0
+        self.suit_cards = np.zeros((4, 4), dtype=np.int64)
+        self.suit_lengths = np.zeros((4, 14), dtype=np.int64)
+        self.hcp = np.zeros((4, MAX_HCP + 1), dtype=np.int64)
+        self.voids = np.zeros(4, dtype=np.int64)
+        self.singletons = np.zeros(4, dtype=np.int64)
+        self.index = HashIndex() if duplicates else None
+        self.duplicates = 0
+
+    def add(self, decks):
+        self.decks += len(decks)
+
+        # serv499 accepts decks with repeated cards, so count them
+        rows = np.arange(len(decks))[:, None]
+        cards = np.bincount((rows * DECK_CARDS + decks).ravel(),
+                minlength=len(decks) * DECK_CARDS)
+        self.incomplete += int(
+                (cards.reshape(-1, DECK_CARDS) != 1).any(axis=1).sum())
+
+        counts = seat_suit_counts(decks)
+        self.suit_cards += counts.sum(axis=0, dtype=np.int64)
+        for seat in range(4):
+            self.suit_lengths[seat] += np.bincount(counts[:, seat].ravel(),
+                    minlength=14)[:14]
+        self.voids += (counts == 0).any(axis=2).sum(axis=0)
+        self.singletons += (counts == 1).any(axis=2).sum(axis=0)
+
+        seats = rows * 4 + np.arange(DECK_CARDS) % 4
+        points = np.bincount(seats.ravel(),
+                weights=HCP[decks % len(RANKS)].ravel(),
+                minlength=len(decks) * 4).astype(np.int64).reshape(-1, 4)
+        for seat in range(4):
+            self.hcp[seat] += np.bincount(points[:, seat],
+                    minlength=MAX_HCP + 1)
+
+        if self.index is not None:
+            self.duplicates += int(self.index.add(deck_hashes(decks)).sum())
+
+
+def print_report(stats, out=sys.stdout):
+    n = stats.decks
+    lengths, void, singleton = expected_rates()
+
+    print("Decks: %d" % n, file=out)
+    if stats.index is not None:
+        print("Duplicate decks: %d" % stats.duplicates, file=out)
+    print("Decks with repeated cards: %d" % stats.incomplete, file=out)
+
+    print("\nMean cards of each suit per seat (expected %.2f)" %
+            (len(RANKS) / 4), file=out)
+    print("Seat " + "".join("%8s" % s for s in SUIT_NAMES), file=out)
+    for seat in range(4):
+        print("%4d " % seat + "".join("%8.3f" % (c / n)
+                for c in stats.suit_cards[seat]), file=out)
+
+    print("\nHigh card points per seat (A=4 K=3 Q=2 J=1, expected mean "
+            "10.00)", file=out)
+    print("Seat     Mean   StdDev  Min  Max", file=out)
+    values = np.arange(MAX_HCP + 1)
+    for seat in range(4):
+        hist = stats.hcp[seat]
+        mean = (hist * values).sum() / n
+        std = np.sqrt((hist * (values - mean) ** 2).sum() / n)
+        present = np.flatnonzero(hist)
+        print("%4d %8.3f %8.3f %4d %4d" % (seat, mean, std, present[0],
+                present[-1]), file=out)
+
+    print("\nHands with a void or singleton (expected %.4f, %.4f)" %
+            (void, singleton), file=out)
+    print("Seat     Void  Singleton", file=out)
+    for seat in range(4):
+        print("%4d %8.4f %10.4f" % (seat, stats.voids[seat] / n,
+                stats.singletons[seat] / n), file=out)
+
+    print("\nSuit length frequency (fraction of a seat's suits)", file=out)
+    print("Length Expected" + "".join("  Seat %d" % s for s in range(4)),
+            file=out)
+    for length in range(14):
+        observed = stats.suit_lengths[:, length] / (4 * n)
+        if not observed.any() and lengths[length] < 1e-4:
+            continue
+        print("%6d %8.4f" % (length, lengths[length]) +
+                "".join("%8.4f" % o for o in observed), file=out)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="deckstats499",
+            description="Report deal statistics for a 499 deck file.")
+    parser.add_argument("deck", help="deck file to analyse")
+    parser.add_argument("-b", "--binary", action="store_true",
+            help="deck file holds %d byte card index records" % DECK_CARDS)
+    parser.add_argument("-n", "--no-duplicates", action="store_true",
+            help="skip the duplicate check (saves 8 bytes per deck)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+
+    try:
+        deck_file = open(args.deck, "rb")
+    except IOError:
+        print("Deck Error", file=sys.stderr)
+        sys.exit(6)
+
+    stats = DeckStats(duplicates=not args.no_duplicates)
+    reader = read_binary_decks if args.binary else read_text_decks
+    try:
+        for decks in reader(deck_file):
+            stats.add(decks)
+    except DeckError as e:
+        print("Deck Error: %s" % e, file=sys.stderr)
+        sys.exit(6)
+    deck_file.close()
+
+    if not stats.decks:
+        print("Deck Error", file=sys.stderr)
+        sys.exit(6)
+
+    print_report(stats)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -39,6 +39,13 @@ RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K', 'A']
 RANK = 0
 SUIT = 1
 
+# Every card, ordered by suit then rank. A card's position in this list is
+# its index in deck499's compact formats and in GameState's bitmasks, and
+# CARD_INDEX maps a card back to it.
+CARDS = [rank + suit for suit in sorted(SUITS, key=lambda s: SUITS[s])
+        for rank in RANKS]
+CARD_INDEX = dict((card, i) for i, card in enumerate(CARDS))
+
 # Bid results
 BID_INVALID = 0
 BID_VALID = 1
@@ -48,6 +55,16 @@ BID_PASS = 2
 MIN_BID = 4
 MAX_BID = 9
 
+# Every bid, in increasing order, and each bid's position in that order
+BIDS = ["%d%s" % (num, suit) for num in range(MIN_BID, MAX_BID + 1)
+        for suit in sorted(SUITS, key=lambda s: SUITS[s])]
+BID_ORDER = dict((bid, i) for i, bid in enumerate(BIDS))
+
+# GameState phases
+PHASE_BIDDING = 0
+PHASE_PLAYING = 1
+PHASE_FINISHED = 2
+
 
 def valid_bid(current_bid, bid):
     if len(bid) != 2:
@@ -83,6 +100,21 @@ def valid_bid(current_bid, bid):
     return BID_INVALID
 
 
+def bid_points(bid):
+    num = int(bid[RANK])
+    suit = bid[SUIT]
+    return 20 + ((num - 4) % 6) * 50 + (SUITS[suit] - 1) * 10
+
+
+def game_winner(scores):
+    """Return the index of the winning team, or None if play continues."""
+    if scores[0] > 499 or scores[1] < -499:
+        return 0
+    elif scores[1] > 499 or scores[0] < -499:
+        return 1
+    return None
+
+
 def higher_card(card1, card2, lead_suit, trumps):
     if (not card2 or
             (card1[SUIT] == trumps and card2[SUIT] != trumps) or
@@ -122,3 +154,195 @@ def valid_play(lead, card, hand):
 
     # Play is valid
     return True
+
+
+# Bitmask of each suit's cards, by suit index
+SUIT_BITS = [((1 << len(RANKS)) - 1) << (s * len(RANKS))
+        for s in range(len(SUITS))]
+
+
+def cards_mask(cards):
+    """Return the bitmask of card indices for a list of cards."""
+    mask = 0
+    for card in cards:
+        mask |= 1 << CARD_INDEX[card]
+    return mask
+
+
+def legal_bids(current_bid):
+    """Return every move valid_bid accepts after current_bid, lowest first."""
+    if not current_bid:
+        return list(BIDS)
+    return BIDS[BID_ORDER[current_bid] + 1:] + ["PP"]
+
+
+def legal_mask(hand, lead):
+    """Return the cards of hand that may be played, both as bitmasks.
+
+    lead is the suit index led to the trick, or None for the lead.
+    """
+    if lead is not None and hand & SUIT_BITS[lead]:
+        return hand & SUIT_BITS[lead]
+    return hand
+
+
+class GameState(object):
+    """The state of one hand of 499, from the deal to the final score.
+
+    Moves are protocol strings: bids (or "PP") while bidding, then cards.
+    apply() checks and makes a move for the player whose turn it is, and
+    undo() reverses the last move in constant time, so search can walk
+    the game tree without copying. Hands are bitmasks of card indices and
+    everything else undo() restores is immutable, so each move saves one
+    tuple. key() is a hashable summary of the position.
+
+    Cards are listed in the order they were dealt, as serv499 sends them,
+    so a strategy sees the same hand in-process and over the network.
+    """
+    __slots__ = ('deal', 'hands', 'phase', 'turn', 'bid', 'bidder',
+            'eligible', 'trick', 'best', 'winner', 'tricks', 'scores',
+            'history')
+
+    def __init__(self, deck, scores=(0, 0)):
+        # Deal round the table, as serv499 does
+        self.deal = tuple(tuple(CARD_INDEX[card] for card in deck[seat::4])
+                for seat in range(4))
+        self.hands = [cards_mask(deck[seat::4]) for seat in range(4)]
+        self.phase = PHASE_BIDDING
+        self.turn = 0
+        self.bid = ""
+        self.bidder = None
+        # Bitmask of players who have not passed
+        self.eligible = 0xf
+        # Card indices played to the current trick, and the best so far
+        self.trick = ()
+        self.best = None
+        self.winner = None
+        self.tricks = (0, 0)
+        self.scores = tuple(scores)
+        self.history = []
+
+    def hand(self, seat):
+        return self.cards(seat, self.hands[seat])
+
+    def cards(self, seat, mask):
+        """Return the cards of seat's deal in mask, in deal order."""
+        return [CARDS[i] for i in self.deal[seat] if mask & (1 << i)]
+
+    @property
+    def trumps(self):
+        return self.bid[SUIT] if self.phase != PHASE_BIDDING else ""
+
+    @property
+    def bid_team(self):
+        return self.bidder % 2
+
+    @property
+    def lead(self):
+        """Suit led to the current trick, or "" before the lead."""
+        if not self.trick:
+            return ""
+        return CARDS[self.trick[0]][SUIT]
+
+    def legal_moves(self):
+        if self.phase == PHASE_BIDDING:
+            return legal_bids(self.bid)
+        elif self.phase == PHASE_PLAYING:
+            lead = self.trick[0] // len(RANKS) if self.trick else None
+            return self.cards(self.turn,
+                    legal_mask(self.hands[self.turn], lead))
+        return []
+
+    def apply(self, move):
+        """Make a move for the current player, or raise ValueError."""
+        seat = self.turn
+        record = (seat, self.hands[seat], self.phase, self.bid,
+                self.bidder, self.eligible, self.trick, self.best,
+                self.winner, self.tricks, self.scores)
+        if self.phase == PHASE_BIDDING:
+            self.apply_bid(seat, move)
+        elif self.phase == PHASE_PLAYING:
+            self.apply_card(seat, move)
+        else:
+            raise ValueError("hand is finished")
+        self.history.append(record)
+
+    def apply_bid(self, seat, bid):
+        if bid == "PP":
+            if not self.bid:
+                raise ValueError("first bidder cannot pass")
+            self.eligible &= ~(1 << seat)
+        else:
+            order = BID_ORDER.get(bid)
+            if order is None or (self.bid and order <= BID_ORDER[self.bid]):
+                raise ValueError("invalid bid '%s'" % bid)
+            self.bid = bid
+            self.bidder = seat
+
+        if self.eligible in (1, 2, 4, 8) or self.bid == BIDS[-1]:
+            # Bidding is over, and the winning bidder leads
+            self.phase = PHASE_PLAYING
+            self.turn = self.bidder
+        else:
+            turn = (seat + 1) % 4
+            while not self.eligible & (1 << turn):
+                turn = (turn + 1) % 4
+            self.turn = turn
+
+    def apply_card(self, seat, card):
+        index = CARD_INDEX.get(card)
+        hand = self.hands[seat]
+        if index is None or not hand & (1 << index):
+            raise ValueError("'%s' is not in hand" % card)
+        suit = index // len(RANKS)
+
+        if self.trick:
+            if not legal_mask(hand, self.trick[0] // len(RANKS)) & (
+                    1 << index):
+                raise ValueError("must follow suit")
+            trumps = SUITS[self.bid[SUIT]] - 1
+            best_suit = self.best // len(RANKS)
+            if ((suit == trumps and best_suit != trumps) or
+                    (suit == best_suit and index > self.best)):
+                self.best = index
+                self.winner = seat
+        else:
+            self.best = index
+            self.winner = seat
+
+        self.hands[seat] = hand & ~(1 << index)
+        self.trick += (index,)
+        if len(self.trick) < 4:
+            self.turn = (seat + 1) % 4
+            return
+
+        # Trick is over, and the winner leads the next one
+        team = self.winner % 2
+        tricks = list(self.tricks)
+        tricks[team] += 1
+        self.tricks = tuple(tricks)
+        self.trick = ()
+        self.turn = self.winner
+
+        if sum(self.tricks) == len(RANKS):
+            points = bid_points(self.bid)
+            if self.tricks[self.bid_team] < int(self.bid[RANK]):
+                points = -points
+            scores = list(self.scores)
+            scores[self.bid_team] += points
+            self.scores = tuple(scores)
+            self.phase = PHASE_FINISHED
+
+    def undo(self):
+        """Take back the last move."""
+        (seat, hand, self.phase, self.bid, self.bidder, self.eligible,
+                self.trick, self.best, self.winner, self.tricks,
+                self.scores) = self.history.pop()
+        self.turn = seat
+        self.hands[seat] = hand
+
+    def key(self):
+        """Return a hashable key identifying the position."""
+        return (tuple(self.hands), self.phase, self.turn, self.bid,
+                self.bidder, self.eligible, self.trick, self.tricks,
+                self.scores)
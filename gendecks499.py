@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# gendecks499 - generate shuffled deck files for serv499
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function
+import sys
+import random
+import argparse
+
+import numpy as np
+
+from game499 import *
+from deck499 import *
+
+# Decks shuffled per batch. Output for a seed depends on this value.
+CHUNK = 65536
+# Longest suit that can be required. About 1 in 700000 deals has a seat
+# with 11 cards of a suit; 12 is over 100 times rarer again.
+MAX_MIN_TRUMPS = 11
+# Batches in a row without a new deck before generation gives up
+MAX_IDLE_BATCHES = 200
+
+
+class GenerateError(Exception):
+    pass
+
+
+def generate_decks(count, seed, unique=False, min_trumps=0):
+    """Yield (n, 52) uint8 arrays of card indices, count decks in total.
+
+    Each batch is CHUNK uniform permutations (argsort of uniform keys),
+    filtered by the options, so the same seed gives the same decks.
+    unique rejects decks whose 64 bit hash has already been generated.
+    min_trumps rejects decks where no seat holds that many cards of a
+    single suit. GenerateError is raised if MAX_IDLE_BATCHES batches in a
+    row produce no deck.
+    """
+    rng = np.random.RandomState(seed)
+    index = HashIndex() if unique else None
+    generated = 0
+    idle = 0
+    while generated < count:
+        decks = rng.random_sample((CHUNK, DECK_CARDS)).argsort(axis=1)
+        decks = decks.astype(np.uint8)
+        if min_trumps:
+            longest = seat_suit_counts(decks).max(axis=(1, 2))
+            decks = decks[longest >= min_trumps]
+        if index is not None:
+            decks = decks[~index.add(deck_hashes(decks))]
+        decks = decks[:count - generated]
+        if not len(decks):
+            idle += 1
+            if idle >= MAX_IDLE_BATCHES:
+                raise GenerateError("no deck accepted in %d decks"
+                        % (idle * CHUNK))
+            continue
+        idle = 0
+        generated += len(decks)
+        yield decks
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="gendecks499",
+            description="Generate uniformly shuffled 499 decks.")
+    parser.add_argument("count", type=int, help="number of decks")
+    parser.add_argument("-o", "--output",
+            help="output file (default: standard output)")
+    parser.add_argument("-s", "--seed", type=int,
+            help="random seed, 0 to 2**32 - 1 (default: random)")
+    parser.add_argument("-u", "--unique", action="store_true",
+            help="reject duplicate decks")
+    parser.add_argument("-t", "--min-trumps", type=int, default=0,
+            metavar="N",
+            help="require a seat with at least N cards of one suit "
+            "(at most %d)" % MAX_MIN_TRUMPS)
+    parser.add_argument("-b", "--binary", action="store_true",
+            help="write %d byte card index records instead of text"
+            % DECK_CARDS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.count < 1 or not 0 <= args.min_trumps <= MAX_MIN_TRUMPS:
+        print("Invalid Arguments", file=sys.stderr)
+        sys.exit(1)
+
+    seed = args.seed
+    if seed is None:
+        seed = random.SystemRandom().randint(0, 2 ** 32 - 1)
+        print("Seed: %d" % seed, file=sys.stderr)
+    elif not 0 <= seed < 2 ** 32:
+        print("Invalid Seed", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        out = open(args.output, "wb")
+    else:
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    try:
+        for decks in generate_decks(args.count, seed, args.unique,
+                args.min_trumps):
+            if args.binary:
+                out.write(decks.tobytes())
+            else:
+                out.write(decks_to_text(decks))
+    except GenerateError as e:
+        print("Generate Error: %s" % e, file=sys.stderr)
+        sys.exit(2)
+
+    out.close()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
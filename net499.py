@@ -0,0 +1,136 @@
+# net499 - buffered line framing for 499 sockets
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+# Initial receive buffer size. Buffers grow up to the line limit as needed.
+INITIAL_BUFFER = 1024
+
+
+class LineTooLong(Exception):
+    pass
+
+
+class LineReader(object):
+    """Read newline terminated lines from a socket.
+
+    Bytes are received straight into a bytearray with recv_into, so each
+    receive takes whatever the network has delivered instead of a single
+    byte, and lines are sliced out through a memoryview. Lines of
+    max_line bytes or more (including the newline) raise LineTooLong as
+    soon as that many bytes have arrived, so at most max_line bytes are
+    ever buffered.
+
+    Blocking servers call readline(). Event loops call fill() once each
+    time the socket is readable, then take lines with next_line() until
+    it returns None. Always check next_line() before waiting on the
+    socket, as one receive may deliver several lines.
+    """
+    __slots__ = ('sock', 'max_line', 'buf', 'start', 'end', 'scanned')
+
+    def __init__(self, sock, max_line):
+        self.sock = sock
+        self.max_line = max_line
+        # Allocated on the first fill, and dropped again by release()
+        self.buf = None
+        self.start = 0
+        self.end = 0
+        # Buffered bytes before this offset hold no newline
+        self.scanned = 0
+
+    def next_line(self):
+        """Return the next buffered line, with its newline, or None."""
+        newline = self.find_newline()
+        if newline < 0:
+            return None
+        if newline - self.start + 1 >= self.max_line:
+            raise LineTooLong()
+        line = memoryview(self.buf)[self.start:newline + 1].tobytes()
+        self.start = self.scanned = newline + 1
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+        return line
+
+    def find_newline(self):
+        """Return the offset of the first buffered newline, or -1.
+
+        Each byte is only searched once, however slowly a line arrives.
+        """
+        if self.scanned == self.end:
+            return -1
+        newline = self.buf.find(b'\n', self.scanned, self.end)
+        self.scanned = self.end if newline < 0 else newline
+        return newline
+
+    def fill(self):
+        """Receive once from the socket into the buffer.
+
+        Returns the number of bytes received, which is 0 at end of file.
+        """
+        if self.buf is None:
+            self.buf = bytearray(min(INITIAL_BUFFER, self.max_line))
+        if self.end == len(self.buf):
+            self.make_room()
+
+        received = self.sock.recv_into(memoryview(self.buf)[self.end:])
+        self.end += received
+
+        if (self.end - self.start >= self.max_line - 1 and
+                self.find_newline() < 0):
+            raise LineTooLong()
+        return received
+
+    def make_room(self):
+        """Move buffered bytes to the front, growing the buffer if full."""
+        if self.start:
+            self.buf[:self.end - self.start] = self.buf[self.start:self.end]
+            self.end -= self.start
+            self.scanned -= self.start
+            self.start = 0
+        if self.end == len(self.buf):
+            size = min(2 * len(self.buf), self.max_line)
+            self.buf += bytearray(size - len(self.buf))
+
+    def readline(self):
+        """Return the next line, blocking until it arrives.
+
+        Like file.readline, returns an empty string at end of file, or
+        any unterminated bytes left before it.
+        """
+        while True:
+            line = self.next_line()
+            if line is not None:
+                return line
+            if not self.fill():
+                line = b''
+                if self.buf is not None:
+                    line = memoryview(self.buf)[self.start:self.end].tobytes()
+                self.start = self.end = self.scanned = 0
+                return line
+
+    def release(self):
+        """Free the buffer if it is empty, e.g. while a player waits."""
+        if self.start == self.end:
+            self.buf = None
+            self.start = self.end = self.scanned = 0
@@ -0,0 +1,183 @@
+# results499 - columnar per-hand results written by serv499
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import array
+import threading
+
+from game499 import *
+
+# Record fields, each stored in its own file of fixed width values. The
+# typecodes mean the same to the array module and to NumPy. Python 2's
+# array module has no 'Q', so game ids use 'L', which is 64 bits on LP64
+# systems.
+COLUMNS = [
+    ('time', 'd'),        # Unix time the hand finished
+    ('game', 'L'),        # Server game id
+    ('hand', 'I'),        # Hand number within the game, from 0
+    ('deck_file', 'I'),   # CRC-32 of the deck file the game dealt from
+    ('deck', 'I'),        # Index of the deck dealt, within that file
+    ('bid', 'B'),         # Winning bid, as an index into game499.BIDS
+    ('bid_team', 'B'),    # Team that won the bidding (0 or 1)
+    ('tricks0', 'B'),     # Tricks won by team 1
+    ('tricks1', 'B'),     # Tricks won by team 2
+    ('points', 'h'),      # Points added to the bid team, negative if set
+    ('score0', 'i'),      # Team 1 score after the hand
+    ('score1', 'i'),      # Team 2 score after the hand
+]
+
+RECORD_BYTES = sum(array.array(code).itemsize for _, code in COLUMNS)
+
+# Start a new segment once a segment holds this many bytes
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+def column_file(segment, name, code):
+    return os.path.join(segment, "%s.%s" % (name, code))
+
+
+def list_segments(directory):
+    """Return the segment directories under directory, oldest first."""
+    names = [n for n in os.listdir(directory) if n.isdigit()]
+    return [os.path.join(directory, n) for n in sorted(names, key=int)]
+
+
+class ResultsWriter(object):
+    """Append hand records to column files, rotating segments by size.
+
+    Each segment is a numbered directory holding one file per column.
+    Records are appended by several game threads, so writes are locked,
+    and each record is flushed so a reader sees whole records.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.files = None
+        self.rows = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Never append to segments from an earlier run
+        segments = list_segments(directory)
+        self.segment = 0
+        if segments:
+            self.segment = int(os.path.basename(segments[-1])) + 1
+
+    def open_segment(self):
+        self.close()
+        path = os.path.join(self.directory, "%06d" % self.segment)
+        os.mkdir(path)
+        self.files = [open(column_file(path, name, code), "ab")
+                for name, code in COLUMNS]
+        self.segment += 1
+        self.rows = 0
+
+    def append(self, record):
+        """Write one record, a sequence of values in COLUMNS order.
+
+        Raises OverflowError, before writing anything, if a value does not
+        fit its column. If a write fails part way the segment is closed, so
+        the next record starts a new segment instead of being misaligned
+        with the columns that were written; load_results drops the partial
+        row.
+        """
+        values = [array.array(code, [value])
+                for (_, code), value in zip(COLUMNS, record)]
+        with self.lock:
+            if self.files is None or (
+                    self.rows * RECORD_BYTES >= self.segment_bytes):
+                self.open_segment()
+            try:
+                for f, value in zip(self.files, values):
+                    value.tofile(f)
+                for f in self.files:
+                    f.flush()
+            except (IOError, OSError):
+                self.close()
+                raise
+            self.rows += 1
+
+    def close(self):
+        if self.files:
+            files, self.files = self.files, None
+            for f in files:
+                try:
+                    f.close()
+                except (IOError, OSError):
+                    # Closing flushes, which fails again after a bad write
+                    pass
+
+
+def hand_record(game_id, hand, deck_file, deck, state):
+    """Build the record for a finished hand from its GameState.
+
+    deck_file is the checksum of the game's decks, as decks at the same
+    index in different files (after a reload) are different deals.
+    """
+    points = bid_points(state.bid)
+    if state.tricks[state.bid_team] < int(state.bid[RANK]):
+        points = -points
+    return (time.time(), game_id, hand, deck_file, deck, BID_ORDER[state.bid],
+            state.bid_team, state.tricks[0], state.tricks[1], points,
+            state.scores[0], state.scores[1])
+
+
+def load_results(directory):
+    """Map every segment's column files into NumPy arrays.
+
+    Returns a dict of column name to array. A single segment is returned
+    as read-only memory maps; several are concatenated. Records only
+    partly written when the server stopped are dropped.
+    """
+    import numpy as np
+
+    columns = dict((name, []) for name, _ in COLUMNS)
+    for segment in list_segments(directory):
+        maps = []
+        for name, code in COLUMNS:
+            path = column_file(segment, name, code)
+            size = os.path.getsize(path) // np.dtype(code).itemsize
+            if size:
+                maps.append(np.memmap(path, dtype=code, mode='r',
+                        shape=(size,)))
+            else:
+                maps.append(np.empty(0, dtype=code))
+        rows = min(len(m) for m in maps)
+        for (name, _), m in zip(COLUMNS, maps):
+            columns[name].append(m[:rows])
+
+    result = {}
+    for name, code in COLUMNS:
+        parts = columns[name]
+        if len(parts) == 1:
+            result[name] = parts[0]
+        elif parts:
+            result[name] = np.concatenate(parts)
+        else:
+            result[name] = np.empty(0, dtype=code)
+    return result
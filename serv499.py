@@ -35,13 +35,24 @@ import errno
 import time
 import select
 import datetime
+import collections
+import itertools
+import getopt
+import zlib
 
 from game499 import *
+from net499 import LineReader, LineTooLong
+from bots499 import SimpleStrategy
+from results499 import ResultsWriter, hand_record
 
 BACKLOG = 5
 HOSTNAME = ''
 PENDING_TIMEOUT = datetime.timedelta(minutes=10)
+# Seconds the accept loop waits for a connection before checking pending
+# games again
+ACCEPT_POLL = 1
 MAX_INPUT = 64 * 1024
+REGISTRY_SHARDS = 16
 
 
 class Server(object):
@@ -49,35 +60,136 @@ class Server(object):
         self.sock = None
         self.greeting = ""
         self.deck_file = None
-        self.decks = []
-        self.pending = {}
-        self.pending_games = []
-        self.games = []
+        self.deck_path = None
+        # (checksum, decks) for new games, replaced whole on reload so a
+        # game never pairs one file's decks with another's checksum
+        self.deck_set = (0, ())
+        # Held for a whole reload, so reloads can't finish out of order
+        self.reload_lock = threading.Lock()
+        # Pending games by name, oldest (least recently joined) first
+        self.pending = collections.OrderedDict()
+        # How long a pending game waits for players before bots fill its
+        # empty seats, or None to never use bots
+        self.bot_wait = None
+        # ResultsWriter recording every finished hand, or None
+        self.results = None
+        self.games = GameRegistry()
         self.scores = {}
-        self.threads = []
+
+
+class RegistryShard(object):
+    __slots__ = ('lock', 'by_id', 'by_name')
+
+    def __init__(self):
+        # Re-entrant, as the SIGINT handler may interrupt a holder
+        self.lock = threading.RLock()
+        self.by_id = {}
+        self.by_name = {}
+
+
+class GameRegistry(object):
+    """Running games, indexed by id and by name.
+
+    Games are spread over shards by name, each shard with its own lock, so
+    game threads starting and ending games rarely contend. A game's id
+    records its shard, so lookup by either key touches a single shard.
+    """
+
+    def __init__(self, shards=REGISTRY_SHARDS):
+        self.shards = [RegistryShard() for i in range(shards)]
+        self.counter = itertools.count()
+
+    def shard_for_name(self, name):
+        return self.shards[hash(name) % len(self.shards)]
+
+    def add(self, game):
+        """Register a game, assigning it a unique id."""
+        index = hash(game.name) % len(self.shards)
+        shard = self.shards[index]
+        game.id = next(self.counter) * len(self.shards) + index
+        with shard.lock:
+            shard.by_id[game.id] = game
+            shard.by_name.setdefault(game.name, {})[game.id] = game
+
+    def remove(self, game):
+        shard = self.shards[game.id % len(self.shards)]
+        with shard.lock:
+            if shard.by_id.pop(game.id, None) is None:
+                return
+            named = shard.by_name[game.name]
+            del named[game.id]
+            if not named:
+                del shard.by_name[game.name]
+
+    def get(self, game_id):
+        """Return the running game with the given id, or None."""
+        shard = self.shards[game_id % len(self.shards)]
+        with shard.lock:
+            return shard.by_id.get(game_id)
+
+    def find(self, name):
+        """Return the running games with the given name."""
+        shard = self.shard_for_name(name)
+        with shard.lock:
+            return list(shard.by_name.get(name, {}).values())
+
+    def snapshot(self):
+        """Return a consistent list of every running game.
+
+        All shard locks are held (in order) while copying, so no game is
+        added or removed part way through.
+        """
+        for shard in self.shards:
+            shard.lock.acquire()
+        try:
+            games = []
+            for shard in self.shards:
+                games.extend(shard.by_id.values())
+            return games
+        finally:
+            for shard in reversed(self.shards):
+                shard.lock.release()
+
+    def __len__(self):
+        return sum(len(shard.by_id) for shard in self.shards)
 
 
 class Player(object):
+    # Players mostly sit idle in pending games, so keep them small: no
+    # instance dict, and no file wrapper around the socket.
+    __slots__ = ('socket', 'reader', 'name', 'bot')
+
     def __init__(self):
         self.socket = None
-        self.sock_file = None
+        self.reader = None
         self.name = ""
-        self.hand = []
+        # Strategy for a server-side bot, which has no socket
+        self.bot = None
 
 
 class Game(object):
+    __slots__ = ('id', 'name', 'server', 'players', 'scores', 'decks',
+            'deck_file', 'deck', 'hands', 'state', 'running', 'start_time',
+            'thread')
+
     def __init__(self):
+        self.id = None
         self.name = None
         self.server = None
         self.players = []
         self.scores = [0, 0]
+        # The server's decks when the game started, kept across reloads,
+        # and their checksum, which tells results from different files apart
+        self.decks = None
+        self.deck_file = None
         self.deck = 0
-        self.lead_player = 0
-        self.bid = ""
-        self.trumps = ""
-        self.bid_team = None
+        # Hands finished so far
+        self.hands = 0
+        # GameState of the hand being played
+        self.state = None
         self.running = True
         self.start_time = None
+        self.thread = None
 
 
 class GameThread(threading.Thread):
@@ -96,13 +208,16 @@ server = None
 def signal_handler(signal, frame):
     if server:
         # End running games
-        for game in server.games:
+        for game in server.games.snapshot():
             game.running = False
             # Close connections
             for p in game.players:
                 close_player(p)
 
         # Close pending games
+        for game in list(server.pending.values()):
+            for p in game.players:
+                close_player(p)
 
     # Exit the server
     sys.exit(0)
@@ -122,44 +237,85 @@ def create_server(port):
     return s
 
 
-def read_decks(server):
-    error = False
-    line_count = 0
+def parse_decks(deck_file):
+    """Read and check every deck in an open deck file.
 
-    for line in server.deck_file.readlines():
-        line_count += 1
+    Returns (checksum, decks), where decks is a tuple of card tuples that
+    is never changed once built and checksum is the CRC-32 of the decks,
+    or None if the file is empty or has an invalid deck.
+    """
+    decks = []
+    checksum = 0
+
+    for line in deck_file:
         line = line.rstrip()  # Strip newline character
 
         # Check that there are enough cards in the deck
         if len(line) != 104:
-            error = True
-            break
+            return None
 
-        all_cards = [line[i] + line[i + 1] for i in range(0, len(line), 2)]
+        all_cards = tuple(line[i] + line[i + 1]
+                for i in range(0, len(line), 2))
 
         # Check all cards are valid
         for card in all_cards:
             if card[SUIT] not in SUITS or card[RANK] not in RANKS:
-                error = True
-                break
-        if error:
-            break
+                return None
 
         # Deck is fine, so add to list of decks
-        server.decks.append(all_cards)
+        decks.append(all_cards)
+        checksum = zlib.crc32(line.encode('ascii'), checksum)
 
-    if error or line_count == 0:
-        print("Deck Error", file=sys.stderr)
-        sys.exit(6)
+    if not decks:
+        return None
+    return checksum & 0xffffffff, tuple(decks)
+
+
+def read_decks(server):
+    with server.reload_lock:
+        deck_set = parse_decks(server.deck_file)
+        if not deck_set:
+            print("Deck Error", file=sys.stderr)
+            sys.exit(6)
+        server.deck_set = deck_set
+
+
+def reload_decks(server):
+    """Read the deck file again, and switch new games to it if valid.
+
+    Runs in its own thread. The decks are swapped with one assignment, and
+    running games keep using the decks they started with. Reloads run one
+    at a time, so each reads the file after the previous swap and the last
+    to finish always reflects the latest SIGHUP.
+    """
+    with server.reload_lock:
+        deck_set = None
+        try:
+            with open(server.deck_path, "r") as deck_file:
+                deck_set = parse_decks(deck_file)
+        except IOError:
+            pass
+
+        if deck_set:
+            server.deck_set = deck_set
+            print("Reloaded %d decks from '%s' (checksum %08x)" % (
+                    len(deck_set[1]), server.deck_path, deck_set[0]))
+        else:
+            print("Deck reload failed, still using %d decks" %
+                    len(server.deck_set[1]), file=sys.stderr)
+
+
+def hangup_handler(signal, frame):
+    if server:
+        # Parse in the background so accepting connections is not held up
+        t = threading.Thread(target=reload_decks, args=(server,))
+        t.daemon = True
+        t.start()
 
 
 def close_player(player):
     print("Closing player: '%s'" % player.name)
     try:
-        # Close the player socket file
-        if player.sock_file:
-            player.sock_file.close()
-
         # Close the player socket
         if player.socket:
             player.socket.shutdown(socket.SHUT_RDWR)
@@ -177,31 +333,52 @@ def end_game(game):
     # Close connections
     for p in game.players:
         close_player(p)
-    # Remove game from the games list
+    # Remove game from the running games
     game.server.games.remove(game)
 
 
 def get_client_input_timeout(game, player, timeout=10):
+    if player.bot:
+        return get_bot_input(game, player)
+
     client_error = False
     memory_error = False
     data = ''
+    deadline = time.time() + timeout
     try:
-        rlist, _, _ = select.select([player.sock_file], [], [], timeout)
-        if rlist:
-            data = player.sock_file.readline(MAX_INPUT)
-        else:
-            # Timeout
-            client_error = True
-            print_to_player("MSorry, too slow.", player.sock_file)
-            print("Kicked player due to read timeout.")
+        # A line may already be buffered from an earlier receive
+        data = player.reader.next_line()
+        while data is None:
+            rlist = []
+            remaining = deadline - time.time()
+            if remaining > 0:
+                try:
+                    rlist, _, _ = select.select([player.socket], [], [],
+                            remaining)
+                except select.error as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    # Interrupted by a signal, such as SIGHUP
+                    continue
+            if not rlist:
+                # Timeout
+                client_error = True
+                print_to_player("MSorry, too slow.", player)
+                print("Kicked player due to read timeout.")
+                break
+            if player.reader.fill():
+                data = player.reader.next_line()
+            else:
+                # End of file, so take any unterminated line
+                data = player.reader.readline()
     except socket.error:
         client_error = True
-    except MemoryError:
+    except (MemoryError, LineTooLong):
         memory_error = True
 
-    if memory_error or len(data) >= (MAX_INPUT):
+    if memory_error:
         client_error = True
-        print_to_player("MNo thanks, I think that's too big", player.sock_file)
+        print_to_player("MNo thanks, I think that's too big", player)
         print("Kicked player due to memory use.")
 
     if client_error or not data:
@@ -214,11 +391,19 @@ def get_client_input_timeout(game, player, timeout=10):
     return data.strip()
 
 
-def print_to_player(message, socket_file):
-    if socket_file:
+def get_bot_input(game, player):
+    """Choose the move for a bot player, whose turn it must be."""
+    state = game.state
+    hand = state.hand(state.turn)
+    if state.phase == PHASE_BIDDING:
+        return player.bot.bid(hand, state.bid)
+    return player.bot.play(hand, state.lead, state.trumps)
+
+
+def print_to_player(message, player):
+    if player.socket:
         try:
-            print(message, file=socket_file)
-            socket_file.flush()
+            player.socket.sendall("%s\n" % message)
         except (socket.error, AttributeError):
             # We do not care about Broken Pipes at this stage
             pass
@@ -229,73 +414,61 @@ def send_message_to_players(game, message, message_type='M', skip_player=None):
         for i, p in enumerate(game.players):
             if i == skip_player:
                 continue
-            print_to_player("%s%s" % (message_type, message), p.sock_file)
+            print_to_player("%s%s" % (message_type, message), p)
 
 
 def deal_hand(game, deck):
-    for i, card in enumerate(game.server.decks[deck]):
-        game.players[i % 4].hand.append(card)
+    cards = game.decks[deck]
+    game.state = GameState(cards, game.scores)
 
-    for p in game.players:
-        print_to_player("H%s" % ''.join(p.hand), p.sock_file)
+    for i, p in enumerate(game.players):
+        print_to_player("H%s" % ''.join(cards[i::4]), p)
 
 
 def get_bids(game):
-    eligible = range(4)
-    current_bid = ""
-    winning_player = None
-    while len(eligible) > 1 and current_bid != "9H":
-        for i in eligible[:]:
-            if len(eligible) == 1 or current_bid == "9H":
-                break
-            p = game.players[i]
-
-            bid_result = BID_INVALID
-            while bid_result not in [BID_VALID, BID_PASS]:
-                print_to_player("B%s" % current_bid, p.sock_file)
-                # Read bid
-                bid = get_client_input_timeout(game, p, timeout=60)
-                if not game.running:
-                    return
-                print("Bid: '%s', Game: '%s'" % (bid, game.name), file=sys.stderr)
-                bid_result = valid_bid(current_bid, bid)
-            if bid_result == BID_PASS:
-                send_message_to_players(game, "%s passes" % p.name,
-                        skip_player=i)
-                eligible.remove(i)
-            else:
-                current_bid = bid
-                winning_player = i
-                send_message_to_players(game, "%s bids %s" % (p.name, bid),
-                        skip_player=i)
+    state = game.state
+    while state.phase == PHASE_BIDDING:
+        i = state.turn
+        p = game.players[i]
+        current_bid = state.bid
+
+        bid_result = BID_INVALID
+        while bid_result not in [BID_VALID, BID_PASS]:
+            print_to_player("B%s" % current_bid, p)
+            # Read bid
+            bid = get_client_input_timeout(game, p, timeout=60)
+            if not game.running:
+                return
+            print("Bid: '%s', Game: '%s'" % (bid, game.name), file=sys.stderr)
+            bid_result = valid_bid(current_bid, bid)
+
+        state.apply(bid)
+        if bid_result == BID_PASS:
+            send_message_to_players(game, "%s passes" % p.name,
+                    skip_player=i)
+        else:
+            send_message_to_players(game, "%s bids %s" % (p.name, bid),
+                    skip_player=i)
 
     # Inform all players of trumps
-    send_message_to_players(game, current_bid, 'T')
-
-    # Store winning bid and player
-    game.bid = current_bid
-    game.trumps = current_bid[SUIT]
-    game.lead_player = winning_player
-    game.bid_team = winning_player % 2
+    send_message_to_players(game, state.bid, 'T')
 
 
 def play_trick(game):
-    current = game.lead_player
-    suit = ""
-    winning_card = ""
-    winning_player = None
+    state = game.state
     for i in range(4):
-        pid = current % 4
+        pid = state.turn
         p = game.players[pid]
+        suit = state.lead
 
         valid = False
         while not valid:
             if i == 0:
                 # Send lead message
-                print_to_player('L', p.sock_file)
+                print_to_player('L', p)
             else:
                 # Send play message
-                print_to_player('P%s' % suit, p.sock_file)
+                print_to_player('P%s' % suit, p)
 
             play = get_client_input_timeout(game, p, timeout=60)
             print("play", p.name, i, "'%s'" % play)
@@ -303,7 +476,7 @@ def play_trick(game):
                 print("play:", play)
                 return -1
 
-            valid = valid_play(suit, play, p.hand)
+            valid = valid_play(suit, play, state.hand(pid))
             if not valid:
                 # Invalid play, so ask for another play
                 continue
@@ -312,24 +485,14 @@ def play_trick(game):
             play_message = "%s plays %s" % (p.name, play)
             send_message_to_players(game, play_message, skip_player=pid)
             # Accept the play
-            print_to_player("A", p.sock_file)
-            # Remove card from player's hand
-            p.hand.remove(play)
+            print_to_player("A", p)
+            # Remove card from player's hand and settle the trick
+            state.apply(play)
 
-            if i == 0:
-                # Store lead suit
-                suit = play[SUIT]
-            if higher_card(play, winning_card, suit, game.trumps):
-                winning_card = play
-                winning_player = pid
-            current += 1
-
-    # Inform players the trick is finished.
+    # The trick winner leads next. Inform players the trick is finished.
+    winning_player = state.turn
     send_message_to_players(game, "%s won" % game.players[winning_player].name)
 
-    # Update the winning player to be the new lead
-    game.lead_player = winning_player
-
     # Return winning team
     return winning_player % 2
 
@@ -343,32 +506,30 @@ def play_hand(game):
     if not game.running:
         return
 
-    tricks_won = [0, 0]
-
     # Play hand
     for i in range(13):
-        winner = play_trick(game)
+        play_trick(game)
         if not game.running:
             return
-        tricks_won[winner] += 1
 
     # Add scores
-    multiplier = 1
-    if tricks_won[game.bid_team] < int(game.bid[RANK]):
-        multiplier = -1
-    game.scores[game.bid_team] += multiplier * bid_points(game.bid)
+    game.scores = list(game.state.scores)
+
+    # Record the hand for offline analysis
+    if game.server.results:
+        record = hand_record(game.id, game.hands, game.deck_file, game.deck,
+                game.state)
+        try:
+            game.server.results.append(record)
+        except (IOError, OSError, OverflowError) as e:
+            print("Could not record hand: %s" % e, file=sys.stderr)
+    game.hands += 1
 
     # Send scores
     scores_message = "Team 1=%d, Team 2=%d" % (game.scores[0], game.scores[1])
     send_message_to_players(game, scores_message)
 
 
-def bid_points(bid):
-    num = int(bid[RANK])
-    suit = bid[SUIT]
-    return 20 + ((num - 4) % 6) * 50 + (SUITS[suit] - 1) * 10
-
-
 def send_player_names(game):
     t1 = "Team1: %s, %s" % (game.players[0].name, game.players[2].name)
     send_message_to_players(game, t1)
@@ -385,17 +546,13 @@ def play_game(game):
             break
 
         # Check for winner
-        if game.scores[0] > 499 or game.scores[1] < -499:
-            # Team 1 won
-            send_message_to_players(game, "Winner is Team 1")
-            break
-        elif game.scores[1] > 499 or game.scores[0] < -499:
-            # Team 2 won
-            send_message_to_players(game, "Winner is Team 2")
+        winner = game_winner(game.scores)
+        if winner is not None:
+            send_message_to_players(game, "Winner is Team %d" % (winner + 1))
             break
 
         # Change to the next deck
-        game.deck = (game.deck + 1) % len(game.server.decks)
+        game.deck = (game.deck + 1) % len(game.decks)
 
     # Finish game
     end_game(game)
@@ -404,97 +561,157 @@ def play_game(game):
 def accept_connection(server, client):
     p = Player()
     p.socket = client
-    p.sock_file = p.socket.makefile(bufsize=0)
+    p.reader = LineReader(client, MAX_INPUT)
 
     # Send greeting
-    print_to_player("M%s" % server.greeting, p.sock_file)
+    print_to_player("M%s" % server.greeting, p)
 
     # Get player name
     p.name = get_client_input_timeout(None, p)
     if not p.name:
-        print_to_player("MInvalid player name.", p.sock_file)
+        print_to_player("MInvalid player name.", p)
         close_player(p)
         return
 
     # Get game name
     game_name = get_client_input_timeout(None, p)
     if not game_name:
-        print_to_player("MInvalid game name.", p.sock_file)
+        print_to_player("MInvalid game name.", p)
         close_player(p)
         return
+    # Nothing more is read until the game starts
+    p.reader.release()
 
-    # Add player to pending game
-    game = server.pending.setdefault(game_name, Game())
-    if game_name not in server.pending_games:
-        server.pending_games.append(game_name)
+    # Add player to pending game, moving it to the back of the queue
+    game = server.pending.pop(game_name, None)
+    if not game:
+        game = Game()
         game.name = game_name
+    server.pending[game_name] = game
     game.players.append(p)
     game.start_time = datetime.datetime.now()
     print("Connection: Player: '%s', Game: '%s'" % (p.name, game_name))
 
     # Check if we need to start the game
     if len(game.players) == 4:
-        game.server = server
-        game.players = sorted(game.players, key=lambda x: x.name)
-        #game.players = sorted(game.players, key=lambda x: x.name.lower())
-        # Add game to list of running games
-        server.games.append(game)
-        # Remove from pending
-        del server.pending[game.name]
-        server.pending_games.remove(game.name)
-
-        # Start thread for game
-        print("Starting game: '%s'" % game.name)
-        gt = GameThread(game)
-        server.threads.append(gt)
-        gt.start()
+        start_pending_game(server, game)
+
+
+def start_pending_game(server, game):
+    game.server = server
+    game.deck_file, game.decks = server.deck_set
+    game.players = sorted(game.players, key=lambda x: x.name)
+    #game.players = sorted(game.players, key=lambda x: x.name.lower())
+    # Add game to running games
+    server.games.add(game)
+    # Remove from pending
+    del server.pending[game.name]
+
+    # Start thread for game. Finished threads need no join, so they
+    # are not tracked beyond the game itself.
+    print("Starting game: '%s' (id %d, %d running)" % (game.name,
+            game.id, len(server.games)))
+    game.thread = GameThread(game)
+    game.thread.start()
+
+
+def fill_pending_games(server):
+    """Seat bots in pending games that have waited server.bot_wait."""
+    now = datetime.datetime.now()
+    while server.pending:
+        game = server.pending[next(iter(server.pending))]
+        if game.start_time + server.bot_wait >= now:
+            break
+        print("Adding bots to pending game '%s'" % game.name)
+        for i in range(len(game.players), 4):
+            bot = Player()
+            bot.name = "bot%d" % i
+            bot.bot = SimpleStrategy()
+            game.players.append(bot)
+        start_pending_game(server, game)
+
+
+def remove_stale_games(server):
+    # Pending games are ordered oldest first
+    now = datetime.datetime.now()
+    while server.pending:
+        g = server.pending[next(iter(server.pending))]
+        if g.start_time + PENDING_TIMEOUT >= now:
+            break
+        print("Removing pending game '%s' due to timeout" % g.name)
+        del server.pending[g.name]
+        for p in g.players:
+            close_player(p)
 
 
 def start_game(server):
     print("started game")
     while True:
-        # Accept connection
+        # Wait for a connection, but look at pending games regularly
         try:
-            client, address = server.sock.accept()
-        except socket.error as e:
-            if e.errno == errno.EMFILE:
-                # Clean up oldest pending game
-                print("Removing pending game due to hitting file limit")
-                name = server.pending_games.pop()
-                game = server.pending[name]
-                for p in game.players:
-                    close_player(p)
-                del server.pending[name]
+            rlist, _, _ = select.select([server.sock], [], [], ACCEPT_POLL)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            # Interrupted by a signal, such as SIGHUP
+            rlist = []
+        if rlist:
+            # Accept connection
+            try:
+                client, address = server.sock.accept()
+            except socket.error as e:
+                if e.errno == errno.EMFILE:
+                    # Clean up oldest pending game
+                    print("Removing pending game due to hitting file limit")
+                    if server.pending:
+                        _, game = server.pending.popitem(last=False)
+                        for p in game.players:
+                            close_player(p)
                 continue
 
-        print("[%s] accepted connection" % time.ctime(), address)
-        accept_connection(server, client)
+            print("[%s] accepted connection" % time.ctime(), address)
+            accept_connection(server, client)
 
-        # Clean up old pending games
-        now = datetime.datetime.now()
-        for game_name in server.pending_games[:]:
-            g = server.pending[game_name]
-            if g.start_time + PENDING_TIMEOUT < now:
-                print("Removing pending game '%s' due to timeout" % g.name)
-                server.pending_games.remove(game_name)
-                del server.pending[game_name]
-
-        # Clean up threads
-        for t in server.threads:
-            t.join(0)
-            if not t.is_alive():
-                server.threads.remove(t)
+        # Give stalled games bots, then clean up old pending games
+        if server.bot_wait is not None:
+            fill_pending_games(server)
+        remove_stale_games(server)
 
 
 def main():
+    global server
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGHUP, hangup_handler)
+    # Restart system calls interrupted by a reload where possible
+    signal.siginterrupt(signal.SIGHUP, False)
 
-    if len(sys.argv) != 4:
-        print("Usage: serv499 port greeting deck", file=sys.stderr)
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "b:r:")
+    except getopt.GetoptError:
+        opts, args = [], []
+    if len(args) != 3:
+        print("Usage: serv499 [-b botwait] [-r resultsdir] port greeting deck",
+                file=sys.stderr)
         sys.exit(1)
 
+    bot_wait = None
+    results_dir = None
+    for opt, value in opts:
+        if opt == "-r":
+            results_dir = value
+        elif opt == "-b":
+            try:
+                bot_wait = datetime.timedelta(seconds=float(value))
+                # Waits too long to add to the time are refused here
+                datetime.datetime.now() + bot_wait
+            except (ValueError, OverflowError):
+                bot_wait = datetime.timedelta(-1)
+            if bot_wait < datetime.timedelta(0):
+                print("Invalid Bot Wait", file=sys.stderr)
+                sys.exit(1)
+
     try:
-        port = int(sys.argv[1])
+        port = int(args[0])
     except ValueError:
         port = 0
 
@@ -504,10 +721,19 @@ def main():
 
     server = Server()
     server.sock = create_server(port)
-    server.greeting = sys.argv[2]
+    server.greeting = args[1]
+    server.bot_wait = bot_wait
+
+    if results_dir:
+        try:
+            server.results = ResultsWriter(results_dir)
+        except (IOError, OSError):
+            print("Results Error", file=sys.stderr)
+            sys.exit(7)
 
+    server.deck_path = args[2]
     try:
-        server.deck_file = open(sys.argv[3], "r")
+        server.deck_file = open(server.deck_path, "r")
     except IOError:
         print("Deck Error", file=sys.stderr)
         sys.exit(6)
@@ -0,0 +1,52 @@
+# test_deck499 - checks the NumPy deck helpers
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy as np
+
+from deck499 import HashIndex
+
+
+class HashIndexTest(unittest.TestCase):
+
+    def test_empty_batches(self):
+        index = HashIndex()
+        none = np.zeros(0, dtype=np.uint64)
+        self.assertEqual(list(index.add(none)), [])
+        self.assertEqual(list(index.add(np.array([3, 1, 3],
+                dtype=np.uint64))), [False, False, True])
+        # A batch of nothing new leaves no empty run to search
+        self.assertEqual(list(index.add(np.array([1], dtype=np.uint64))),
+                [True])
+        self.assertEqual(list(index.add(none)), [])
+        self.assertEqual(list(index.add(np.array([2, 3], dtype=np.uint64))),
+                [False, True])
+        self.assertEqual(len(index), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# test_game499 - checks GameState against the original 499 rules
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import unittest
+
+from game499 import *
+from bots499 import legal_plays, RandomStrategy
+
+# Random hands played against the reference rules
+HANDS = 300
+
+
+class ReferenceHand(object):
+    """One hand played with valid_bid, valid_play and higher_card, the way
+    serv499's get_bids and play_trick did before GameState.
+    """
+
+    def __init__(self, deck, scores):
+        self.hands = [list(deck[seat::4]) for seat in range(4)]
+        self.scores = list(scores)
+
+    def bids(self, current_bid):
+        return [bid for bid in BIDS + ["PP"]
+                if valid_bid(current_bid, bid) in (BID_VALID, BID_PASS)]
+
+    def plays(self, seat, suit):
+        hand = self.hands[seat]
+        return [card for card in hand if valid_play(suit, card, hand)]
+
+
+class GameStateTest(unittest.TestCase):
+
+    def check_move(self, state, expected_turn, legal, rng, keys):
+        """Check the state agrees with the reference, then make a move."""
+        self.assertEqual(state.turn, expected_turn)
+        self.assertEqual(state.legal_moves(), legal)
+        key = state.key()
+        keys.append(key)
+
+        # Illegal moves are refused without changing the state
+        illegal = [m for m in BIDS + ["PP"] + CARDS if m not in legal]
+        if state.phase == PHASE_PLAYING:
+            illegal = [m for m in illegal if m in CARDS]
+        self.assertRaises(ValueError, state.apply, rng.choice(illegal))
+        self.assertEqual(state.key(), key)
+
+        move = rng.choice(legal)
+        state.apply(move)
+        return move
+
+    def play_hand(self, rng, scores):
+        deck = list(CARDS)
+        rng.shuffle(deck)
+        state = GameState(deck, scores)
+        ref = ReferenceHand(deck, scores)
+        keys = []
+
+        for seat in range(4):
+            self.assertEqual(state.hand(seat), ref.hands[seat])
+
+        # Bidding, in the order serv499 used to ask for bids
+        eligible = list(range(4))
+        current_bid = ""
+        bidder = None
+        while len(eligible) > 1 and current_bid != BIDS[-1]:
+            for i in eligible[:]:
+                if len(eligible) == 1 or current_bid == BIDS[-1]:
+                    break
+                bid = self.check_move(state, i, ref.bids(current_bid), rng,
+                        keys)
+                if bid == "PP":
+                    eligible.remove(i)
+                else:
+                    current_bid = bid
+                    bidder = i
+        self.assertEqual(state.phase, PHASE_PLAYING)
+        self.assertEqual((state.bid, state.bidder), (current_bid, bidder))
+
+        trumps = current_bid[SUIT]
+        lead_player = bidder
+        tricks = [0, 0]
+        for trick in range(len(RANKS)):
+            suit = ""
+            winning_card = ""
+            winning_player = None
+            for i in range(4):
+                pid = (lead_player + i) % 4
+                legal = ref.plays(pid, suit)
+                self.assertEqual(legal_plays(suit, ref.hands[pid]), legal)
+                play = self.check_move(state, pid, legal, rng, keys)
+                ref.hands[pid].remove(play)
+                self.assertEqual(state.hand(pid), ref.hands[pid])
+                if i == 0:
+                    suit = play[SUIT]
+                if higher_card(play, winning_card, suit, trumps):
+                    winning_card = play
+                    winning_player = pid
+            lead_player = winning_player
+            tricks[winning_player % 2] += 1
+            if trick < len(RANKS) - 1:
+                self.assertEqual(state.turn, lead_player)
+            self.assertEqual(state.tricks, tuple(tricks))
+
+        bid_team = bidder % 2
+        points = bid_points(current_bid)
+        if tricks[bid_team] < int(current_bid[RANK]):
+            points = -points
+        ref.scores[bid_team] += points
+        self.assertEqual(state.phase, PHASE_FINISHED)
+        self.assertEqual(state.scores, tuple(ref.scores))
+        self.assertEqual(state.legal_moves(), [])
+
+        # Undo walks back through exactly the positions seen
+        final = state.scores
+        while keys:
+            state.undo()
+            self.assertEqual(state.key(), keys.pop())
+        self.assertEqual(state.hand(0), list(deck[0::4]))
+        return final
+
+    def test_matches_reference_rules(self):
+        rng = random.Random(499)
+        scores = (0, 0)
+        for hand in range(HANDS):
+            scores = self.play_hand(rng, scores)
+            if game_winner(scores) is not None:
+                scores = (0, 0)
+
+    def test_random_strategy_sees_deal_order(self):
+        # A seeded strategy must choose the same card whether it is given
+        # the hand by GameState or by serv499's H message
+        deck = list(CARDS)
+        random.Random(1).shuffle(deck)
+        state = GameState(deck)
+        for seat in range(4):
+            self.assertEqual(state.hand(seat), list(deck[seat::4]))
+        a = RandomStrategy(7).play(state.hand(0), "", "")
+        b = RandomStrategy(7).play(list(deck[0::4]), "", "")
+        self.assertEqual(a, b)
+
+
+if __name__ == '__main__':
+    unittest.main()
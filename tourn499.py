@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+# tourn499 - round-robin tournaments between 499 bot strategies
+#
+# Copyright (c) 2013, Joel Addison (jea)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function, division
+import sys
+import os
+import re
+import json
+import math
+import socket
+import argparse
+import threading
+import itertools
+import multiprocessing
+
+from game499 import *
+from bots499 import load_strategy
+import serv499
+
+# Hands played before a game is abandoned as a draw
+MAX_HANDS = 200
+# Seconds to wait on the server before giving up on a network game
+NETWORK_TIMEOUT = 120
+# Moves in a row serv499 may reject before a network seat gives up
+MAX_REJECTED = 3
+# z value for the 95% confidence intervals in the report
+CONFIDENCE_Z = 1.96
+
+
+class StrategyError(Exception):
+    pass
+
+
+class Tournament(object):
+    def __init__(self):
+        self.strategies = []
+        self.decks = []
+        self.games = 0
+        self.seed = 0
+        self.max_hands = MAX_HANDS
+        self.server = None
+
+
+# Tournament settings for pool workers, set by init_worker.
+tournament = None
+
+
+def init_worker(t):
+    global tournament
+    tournament = t
+
+
+def schedule(t):
+    """Yield (game id, team 1 strategy, team 2 strategy, start deck).
+
+    Every pair of strategies plays t.games games. Consecutive games swap
+    which strategy sits in seats 0/2 (team 1) and 1/3 (team 2) while
+    starting from the same deck, so both partnerships see the same cards.
+    """
+    game_id = 0
+    for a, b in itertools.combinations(range(len(t.strategies)), 2):
+        for r in range(t.games):
+            teams = (a, b) if r % 2 == 0 else (b, a)
+            start_deck = (r // 2) % len(t.decks)
+            yield (game_id, teams[0], teams[1], start_deck)
+            game_id += 1
+
+
+def seat_strategies(t, game_id, team1, team2):
+    """Create the four seat strategies for a game, seeded per seat."""
+    seats = []
+    for seat in range(4):
+        index = team1 if seat % 2 == 0 else team2
+        seed = (t.seed * 100003 + game_id) * 4 + seat
+        seats.append(load_strategy(t.strategies[index], seed))
+    return seats
+
+
+def play_local_game(seats, decks, start_deck, max_hands):
+    """Play a game in-process with the same rules as serv499.
+
+    Returns (winning team or None for a draw, scores, hands played).
+    """
+    scores = (0, 0)
+    deck = start_deck
+    for hand_count in range(1, max_hands + 1):
+        state = GameState(decks[deck], scores)
+        while state.phase != PHASE_FINISHED:
+            seat = state.turn
+            if state.phase == PHASE_BIDDING:
+                move = seats[seat].bid(state.hand(seat), state.bid)
+            else:
+                move = seats[seat].play(state.hand(seat), state.lead,
+                        state.trumps)
+            try:
+                state.apply(move)
+            except ValueError as e:
+                raise StrategyError("Invalid move '%s': %s" % (move, e))
+        scores = state.scores
+
+        winner = game_winner(scores)
+        if winner is not None:
+            return winner, list(scores), hand_count
+
+        deck = (deck + 1) % len(decks)
+    return None, list(scores), max_hands
+
+
+def send_line(sock, message):
+    sock.sendall(("%s\n" % message).encode('ascii'))
+
+
+def play_network_seat(strategy, name, game_name, outcome, max_hands):
+    """Play one seat of a serv499 game using the client protocol.
+
+    All seats see the same messages, so each records the result in outcome.
+    serv499 asks again straight away after an invalid move, where other
+    moves are answered with 'A' or followed by other players' messages, so
+    a prompt straight after another means the move was rejected.
+    """
+    host, port = tournament.server
+    sock = socket.create_connection((host, port), NETWORK_TIMEOUT)
+    sock_file = sock.makefile('r')
+    hand = []
+    trumps = ""
+    last_play = None
+    hand_count = 0
+    rejected = 0
+    prompted = False
+    try:
+        send_line(sock, name)
+        send_line(sock, game_name)
+        while True:
+            message = sock_file.readline().strip()
+            if not message or message[0] == 'O':
+                break
+            kind, body = message[0], message[1:]
+            if kind in 'BLP':
+                rejected = rejected + 1 if prompted else 0
+                if rejected >= MAX_REJECTED:
+                    outcome['error'] = "'%s' keeps making invalid moves" % (
+                            name)
+                    break
+            prompted = kind in 'BLP'
+            if kind == 'M':
+                scores = re.match(r"Team 1=(-?\d+), Team 2=(-?\d+)$", body)
+                if scores:
+                    outcome['scores'] = [int(x) for x in scores.groups()]
+                elif body.startswith("Winner is Team "):
+                    outcome['winner'] = int(body[-1]) - 1
+            elif kind == 'H':
+                hand = [body[i:i + 2] for i in range(0, len(body), 2)]
+                hand_count += 1
+                outcome['hands'] = max(outcome['hands'], hand_count)
+                if hand_count > max_hands:
+                    # Abandon the game as a draw
+                    outcome['hands'] = max_hands
+                    break
+            elif kind == 'B':
+                send_line(sock, strategy.bid(list(hand), body))
+            elif kind == 'T':
+                trumps = body[SUIT]
+            elif kind in 'LP':
+                last_play = strategy.play(list(hand), body, trumps)
+                send_line(sock, last_play)
+            elif kind == 'A':
+                hand.remove(last_play)
+    except socket.error as e:
+        outcome['error'] = "'%s' lost the server: %s" % (name, e)
+    finally:
+        sock_file.close()
+        sock.close()
+
+
+def play_network_game(seats, game_id, max_hands):
+    """Play a game against a running serv499.
+
+    serv499 seats players in name order, so names are prefixed with the
+    seat number. The server always starts a game from its first deck, so
+    games between the same seating differ only by strategy randomness.
+    """
+    game_name = "tourn%d-%d" % (os.getpid(), game_id)
+    outcome = {'winner': None, 'scores': [0, 0], 'hands': 0}
+    threads = []
+    for seat, strategy in enumerate(seats):
+        t = threading.Thread(target=play_network_seat,
+                args=(strategy, "%d-seat" % seat, game_name, outcome,
+                    max_hands))
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+    if outcome.get('error'):
+        raise StrategyError("Network game '%s' failed: %s" % (game_name,
+                outcome['error']))
+    return outcome['winner'], outcome['scores'], outcome['hands']
+
+
+def run_game(game):
+    """Pool task: play one scheduled game and return its result record."""
+    game_id, team1, team2, start_deck = game
+    seats = seat_strategies(tournament, game_id, team1, team2)
+    if tournament.server:
+        winner, scores, hands = play_network_game(seats, game_id,
+                tournament.max_hands)
+    else:
+        winner, scores, hands = play_local_game(seats, tournament.decks,
+                start_deck, tournament.max_hands)
+    return {
+        'id': game_id,
+        'teams': [team1, team2],
+        'winner': winner,
+        'scores': scores,
+        'hands': hands,
+    }
+
+
+def checkpoint_header(t, deck_name):
+    return {
+        'strategies': t.strategies,
+        'games': t.games,
+        'seed': t.seed,
+        'deck': deck_name,
+        'max_hands': t.max_hands,
+        'server': "%s:%d" % t.server if t.server else None,
+    }
+
+
+def load_checkpoint(path, header):
+    """Return the results already recorded in a checkpoint file.
+
+    The first line of the file records the tournament settings, and
+    resuming with different settings is refused. Partly written lines
+    (from an interrupted run) are ignored.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        lines = f.readlines()
+    if not lines:
+        return results
+    if json.loads(lines[0]) != header:
+        print("Checkpoint '%s' is from a different tournament" % path,
+                file=sys.stderr)
+        sys.exit(3)
+    for line in lines[1:]:
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        results[result['id']] = result
+    return results
+
+
+def wilson_interval(wins, games, z=CONFIDENCE_Z):
+    """Wilson score interval for a win rate of wins out of games."""
+    if not games:
+        return 0.0, 1.0
+    p = wins / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / games +
+            z * z / (4 * games * games)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def print_report(t, results, out=sys.stdout):
+    count = len(t.strategies)
+    games = [0] * count
+    wins = [0] * count
+    draws = [0] * count
+    pair_games = {}
+    pair_wins = {}
+    for result in results:
+        teams = result['teams']
+        winner = result['winner']
+        for team, index in enumerate(teams):
+            games[index] += 1
+            if winner is None:
+                draws[index] += 1
+            elif winner == team:
+                wins[index] += 1
+        pair = tuple(sorted(teams))
+        pair_games[pair] = pair_games.get(pair, 0) + 1
+        if winner is not None:
+            key = (pair, teams[winner])
+            pair_wins[key] = pair_wins.get(key, 0) + 1
+
+    print("%-24s %7s %7s %6s %8s  %s" % ("Strategy", "Games", "Wins",
+            "Draws", "Win rate", "95% CI"), file=out)
+    for i, name in enumerate(t.strategies):
+        low, high = wilson_interval(wins[i], games[i])
+        rate = wins[i] / games[i] if games[i] else 0.0
+        print("%-24s %7d %7d %6d %8.3f  [%.3f, %.3f]" % (name, games[i],
+                wins[i], draws[i], rate, low, high), file=out)
+
+    print("", file=out)
+    for pair in sorted(pair_games):
+        a, b = pair
+        played = pair_games[pair]
+        a_wins = pair_wins.get((pair, a), 0)
+        low, high = wilson_interval(a_wins, played)
+        print("%s vs %s: %d-%d in %d games, %.3f [%.3f, %.3f]" % (
+                t.strategies[a], t.strategies[b], a_wins,
+                pair_wins.get((pair, b), 0), played, a_wins / played,
+                low, high), file=out)
+
+    if t.server:
+        print("", file=out)
+        print("Note: network games all start from the server's first deck,",
+                file=out)
+        print("so they are not independent and the intervals above are too",
+                file=out)
+        print("narrow. Use in-process games for significance.", file=out)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="tourn499",
+            description="Round-robin tournament between 499 strategies.")
+    parser.add_argument("deck", help="deck file in serv499 format")
+    parser.add_argument("strategies", nargs="+", metavar="strategy",
+            help="built-in strategy name or module[:attr] plugin")
+    parser.add_argument("-g", "--games", type=int, default=100,
+            help="games per pair of strategies (default 100)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+            help="worker processes (default: one per CPU)")
+    parser.add_argument("-c", "--checkpoint",
+            help="file to record results in and resume from")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+            help="base seed for strategy randomness")
+    parser.add_argument("--max-hands", type=int, default=MAX_HANDS,
+            help="hands before a game is a draw (default %d)" % MAX_HANDS)
+    parser.add_argument("--server", metavar="[HOST:]PORT",
+            help="play against a running serv499 instead of in-process")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if len(args.strategies) < 2 or args.games < 1 or args.max_hands < 1:
+        print("Need two strategies and a positive number of games",
+                file=sys.stderr)
+        sys.exit(1)
+
+    t = Tournament()
+    t.strategies = args.strategies
+    t.games = args.games
+    t.seed = args.seed
+    t.max_hands = args.max_hands
+
+    if args.server:
+        host, _, port = args.server.rpartition(':')
+        try:
+            t.server = (host or "localhost", int(port))
+        except ValueError:
+            print("Invalid Port", file=sys.stderr)
+            sys.exit(4)
+        # Only the two seatings of a pair give different cards over the
+        # network, as the server can't be told which deck to start on
+        if t.games > 2:
+            print("Warning: every network game starts from the server's "
+                    "first deck, so games beyond the 2 seatings per pair "
+                    "only repeat them apart from strategy randomness",
+                    file=sys.stderr)
+
+    # Check every strategy loads before starting any workers
+    for spec in t.strategies:
+        try:
+            load_strategy(spec)
+        except (ImportError, AttributeError, ValueError) as e:
+            print("Strategy Error: %s" % e, file=sys.stderr)
+            sys.exit(2)
+
+    deck_server = serv499.Server()
+    try:
+        deck_server.deck_file = open(args.deck, "r")
+    except IOError:
+        print("Deck Error", file=sys.stderr)
+        sys.exit(6)
+    serv499.read_decks(deck_server)
+    t.decks = deck_server.deck_set[1]
+
+    done = {}
+    checkpoint = None
+    if args.checkpoint:
+        header = checkpoint_header(t, os.path.abspath(args.deck))
+        done = load_checkpoint(args.checkpoint, header)
+        checkpoint = open(args.checkpoint, "a+")
+        checkpoint.seek(0)
+        contents = checkpoint.read()
+        if not contents:
+            checkpoint.write(json.dumps(header) + "\n")
+        elif not contents.endswith("\n"):
+            # Terminate a line cut short by an interrupted run
+            checkpoint.write("\n")
+    results = list(done.values())
+    remaining = [g for g in schedule(t) if g[0] not in done]
+    print("Playing %d games (%d already done)" % (len(remaining),
+            len(done)), file=sys.stderr)
+
+    pool = multiprocessing.Pool(args.jobs, init_worker, (t,))
+    try:
+        for result in pool.imap_unordered(run_game, remaining):
+            results.append(result)
+            if checkpoint:
+                checkpoint.write(json.dumps(result) + "\n")
+                checkpoint.flush()
+        pool.close()
+    except StrategyError as e:
+        pool.terminate()
+        print("Strategy Error: %s" % e, file=sys.stderr)
+        sys.exit(2)
+    except BaseException:
+        # Stop the workers, or join() fails and hides the real error
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if checkpoint:
+            checkpoint.close()
+
+    print_report(t, results)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()